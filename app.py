@@ -1,7 +1,8 @@
-import time, math, os, io
+import io
+from itertools import accumulate
+import numpy as np
 import streamlit as st
 import pandas as pd
-import pydeck as pdk
 
 st.set_page_config(page_title="Nearest Safe Shelter — Vyshhorod", layout="wide")
 
@@ -13,6 +14,8 @@ TICK_SECONDS = 1.0                     # refresh cadence
 
 # ALERT/SAFE pattern in seconds (loops forever)
 PATTERN = [("ALERT", 120), ("SAFE", 60), ("ALERT", 45), ("SAFE", 90)]
+_CUM = np.array([0] + list(accumulate(d for _, d in PATTERN)))  # phase start offsets + loop length
+_STATES = [s for s, _ in PATTERN]
 
 # Built-in demo shelters near Vyshhorod (edit freely).
 # You can also upload a CSV (name,lat,lon[,type,capacity])
@@ -31,33 +34,34 @@ DEFAULT_SHELTERS = [
 # Helpers
 # ----------------------------
 def haversine_km(lat1, lon1, lat2, lon2):
+    """Great-circle distance in km; accepts scalars or NumPy arrays (vectorized)."""
     R = 6371.0
-    p1, p2 = math.radians(lat1), math.radians(lat2)
-    dphi = math.radians(lat2 - lat1)
-    dlmb = math.radians(lon2 - lon1)
-    a = math.sin(dphi/2)**2 + math.cos(p1)*math.cos(p2)*math.sin(dlmb/2)**2
-    return 2*R*math.asin(math.sqrt(a))
-
-def pattern_length():
-    return sum(d for _, d in PATTERN)
+    p1, p2 = np.radians(lat1), np.radians(lat2)
+    dphi = np.radians(lat2 - lat1)
+    dlmb = np.radians(lon2 - lon1)
+    a = np.sin(dphi/2)**2 + np.cos(p1)*np.cos(p2)*np.sin(dlmb/2)**2
+    return 2*R*np.arcsin(np.sqrt(a))
 
 def state_at(t):
     """Return (state, elapsed_in_state, remaining_in_state) for t seconds into the loop."""
-    t_mod = t % pattern_length()
-    cum = 0
-    for state, dur in PATTERN:
-        if t_mod < cum + dur:
-            elapsed = t_mod - cum
-            remain = dur - elapsed
-            return state, int(elapsed), int(remain)
-        cum += dur
-    return "SAFE", 0, PATTERN[1][1]
-
-def load_shelters_from_csv(file) -> pd.DataFrame:
-    df = pd.read_csv(file)
+    t_mod = t % _CUM[-1]
+    i = int(np.searchsorted(_CUM, t_mod, side="right")) - 1
+    return _STATES[i], int(t_mod - _CUM[i]), int(_CUM[i+1] - t_mod)
+
+@st.cache_data(show_spinner=False, max_entries=8)
+def load_shelters_from_csv(data: bytes) -> pd.DataFrame:
+    """Parse an uploaded shelters CSV; cached on the file bytes so reruns don't re-parse it."""
+    df = pd.read_csv(io.BytesIO(data))
     if not {"name","lat","lon"}.issubset(df.columns):
         raise ValueError("CSV must have columns: name, lat, lon (optionally: type, capacity)")
-    return df[["name","lat","lon"] + [c for c in ["type","capacity"] if c in df.columns]].copy()
+    return df[["name","lat","lon"] + [c for c in ["type","capacity"] if c in df.columns]]
+
+def rank_shelters(shelters_df: pd.DataFrame, home_lat: float, home_lon: float) -> pd.DataFrame:
+    """Shelters with distance/ETA from home, nearest first (ties keep input order)."""
+    df_s = shelters_df.copy()
+    df_s["dist_km"] = haversine_km(home_lat, home_lon, df_s["lat"].to_numpy(dtype=float), df_s["lon"].to_numpy(dtype=float))
+    df_s["eta_min"] = (df_s["dist_km"] * 12).clip(lower=1).round().astype(int)  # walk ~5 km/h -> ~12 min/km
+    return df_s.sort_values("dist_km", kind="stable")
 
 # ----------------------------
 # Session state
@@ -86,7 +90,7 @@ with st.sidebar.expander("Shelters data", expanded=True):
     up = st.file_uploader("Upload shelters.csv", type=["csv"])
     if up is not None:
         try:
-            ss.shelters_df = load_shelters_from_csv(up)
+            ss.shelters_df = load_shelters_from_csv(up.getvalue())
             st.success(f"Loaded {len(ss.shelters_df)} shelters from CSV.")
         except Exception as e:
             st.error(f"CSV error: {e}")
@@ -118,13 +122,11 @@ is_alert = (state == "ALERT")
 
 home_lat, home_lon = ss.home_lat, ss.home_lon
 
-df_s = ss.shelters_df.copy()
-df_s["dist_km"] = df_s.apply(lambda r: haversine_km(home_lat, home_lon, r["lat"], r["lon"]), axis=1)
-df_s["eta_min"] = (df_s["dist_km"] * 12).clip(lower=1).round().astype(int)  # walk ~5 km/h -> ~12 min/km
+df_s = rank_shelters(ss.shelters_df, home_lat, home_lon)
 
-# Filter to focus radius
-df_focus = df_s[df_s["dist_km"] <= radius_km].sort_values("dist_km")
-top2 = df_focus.head(2) if not df_focus.empty else df_s.nsmallest(2, "dist_km")
+# Filter to focus radius (df_s is already sorted by distance)
+df_focus = df_s[df_s["dist_km"] <= radius_km]
+top2 = df_focus.head(2) if not df_focus.empty else df_s.head(2)
 
 # ----------------------------
 # UI — Status + guidance
@@ -151,7 +153,7 @@ with colA:
     if top2.empty:
         st.warning("No shelters within radius. Increase the radius or upload a CSV.")
     else:
-        for _, srow in top2.iterrows():
+        for srow in top2.to_dict("records"):
             line = f"**{srow['name']}** — {srow['dist_km']:.2f} km • ~{srow['eta_min']} min walk"
             if "type" in srow and not pd.isna(srow["type"]):
                 line += f" • {srow['type']}"